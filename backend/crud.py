@@ -1,3 +1,5 @@
+from sqlalchemy import select, func, case, or_, Date
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from . import models, schemas
 from passlib.context import CryptContext
@@ -75,3 +77,134 @@ def get_user_trades(db: Session, user_id: int, skip: int = 0, limit: int = 100):
 
 def get_open_trades(db: Session, user_id: int):
     return db.query(models.Trade).filter(models.Trade.user_id == user_id, models.Trade.status == "OPEN").all()
+
+def acquire_engine_lease(db: Session, holder: str, ttl_seconds: int):
+    # Take over or renew the engine lease. The conditional UPDATE is atomic,
+    # so at most one process across all tasks sharing the DB wins.
+    from datetime import datetime, timedelta
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl_seconds)
+    updated = db.query(models.EngineLease).filter(
+        models.EngineLease.id == 1,
+        or_(models.EngineLease.holder == holder, models.EngineLease.expires_at < now)
+    ).update({"holder": holder, "expires_at": expires_at}, synchronize_session=False)
+    if updated:
+        db.commit()
+        return True
+    if db.query(models.EngineLease.id).filter(models.EngineLease.id == 1).first() is not None:
+        db.rollback()
+        return False
+    db.add(models.EngineLease(id=1, holder=holder, expires_at=expires_at))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return False
+    return True
+
+def release_engine_lease(db: Session, holder: str):
+    from datetime import datetime
+    db.query(models.EngineLease).filter(
+        models.EngineLease.id == 1, models.EngineLease.holder == holder
+    ).update({"expires_at": datetime.utcnow()}, synchronize_session=False)
+    db.commit()
+
+def get_engine_lease(db: Session):
+    return db.query(models.EngineLease).filter(models.EngineLease.id == 1).first()
+
+def update_risk_limits(db: Session, user_id: int, limits: dict):
+    # Partial update: only the given limits change; a None value resets that
+    # limit to the engine default
+    user = db.query(models.User).filter(models.User.id == user_id).first()
+    if user:
+        for name, value in limits.items():
+            setattr(user, name, value)
+        db.commit()
+        db.refresh(user)
+    return user
+
+def set_kill_switch(db: Session, user_id: int, active: bool):
+    user = db.query(models.User).filter(models.User.id == user_id).first()
+    if user:
+        user.kill_switch = active
+        db.commit()
+        db.refresh(user)
+    return user
+
+def get_global_kill_switch(db: Session):
+    settings = db.query(models.RiskSettings).filter(models.RiskSettings.id == 1).first()
+    return bool(settings and settings.global_kill_switch)
+
+def set_global_kill_switch(db: Session, active: bool):
+    from datetime import datetime
+    settings = db.query(models.RiskSettings).filter(models.RiskSettings.id == 1).first()
+    if settings is None:
+        settings = models.RiskSettings(id=1)
+        db.add(settings)
+    settings.global_kill_switch = active
+    settings.updated_at = datetime.now()
+    db.commit()
+    db.refresh(settings)
+    return settings
+
+def get_risk_snapshot(db: Session, user_id: int, day_start):
+    # Seed values for the in-memory risk counters: realized P/L and trades
+    # entered since day_start, plus the notional of every open position
+    trades_today = db.query(func.count(models.Trade.id)).filter(
+        models.Trade.user_id == user_id, models.Trade.entry_time >= day_start
+    ).scalar()
+    realized_pnl = db.query(func.coalesce(func.sum(models.Trade.pnl), 0.0)).filter(
+        models.Trade.user_id == user_id, models.Trade.status == "CLOSED", models.Trade.exit_time >= day_start
+    ).scalar()
+    open_positions = {
+        trade_id: entry_price * quantity
+        for trade_id, entry_price, quantity in db.query(
+            models.Trade.id, models.Trade.entry_price, models.Trade.quantity
+        ).filter(models.Trade.user_id == user_id, models.Trade.status == "OPEN")
+    }
+    return float(realized_pnl), trades_today, open_positions
+
+TRADE_EXPORT_COLUMNS = [
+    models.Trade.id, models.Trade.user_id, models.Trade.symbol,
+    models.Trade.entry_time, models.Trade.exit_time, models.Trade.entry_price, models.Trade.exit_price,
+    models.Trade.quantity, models.Trade.pnl, models.Trade.status, models.Trade.reason,
+]
+
+TRADE_GROUPINGS = {
+    "day": func.date(models.Trade.entry_time, type_=Date),
+    "symbol": models.Trade.symbol,
+    "reason": models.Trade.reason,
+}
+
+def _filter_trades(query, user_id=None, start=None, end=None):
+    if user_id is not None:
+        query = query.where(models.Trade.user_id == user_id)
+    if start is not None:
+        query = query.where(models.Trade.entry_time >= start)
+    if end is not None:
+        query = query.where(models.Trade.entry_time < end)
+    return query
+
+def _stream(db: Session, query, chunk_size: int):
+    # Server-side cursor, fetched chunk_size rows at a time as plain tuples.
+    # Returns the selected columns (for names and types) and the chunk iterator.
+    result = db.execute(query.execution_options(stream_results=True, yield_per=chunk_size))
+    return list(query.selected_columns), result.partitions()
+
+def stream_trades(db: Session, user_id: int = None, start=None, end=None, chunk_size: int = 1000):
+    query = _filter_trades(select(*TRADE_EXPORT_COLUMNS), user_id, start, end).order_by(models.Trade.id)
+    return _stream(db, query, chunk_size)
+
+def stream_trade_aggregates(db: Session, group_by: str, user_id: int = None, start=None, end=None, chunk_size: int = 1000):
+    key = TRADE_GROUPINGS[group_by].label(group_by)
+    keys = [key] if user_id is not None else [models.Trade.user_id, key]
+    query = select(
+        *keys,
+        func.count(models.Trade.id).label("trades"),
+        func.sum(case((models.Trade.status == "CLOSED", 1), else_=0)).label("closed"),
+        func.sum(case((models.Trade.pnl > 0, 1), else_=0)).label("wins"),
+        func.sum(models.Trade.quantity).label("quantity"),
+        func.coalesce(func.sum(models.Trade.pnl), 0.0).label("pnl"),
+    )
+    query = _filter_trades(query, user_id, start, end).group_by(*keys).order_by(*keys)
+    return _stream(db, query, chunk_size)
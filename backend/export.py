@@ -0,0 +1,105 @@
+import csv
+import io
+import json
+import datetime
+
+# Chunk encoders for streaming trade exports. Each takes the selected
+# SQLAlchemy columns and an iterator of row chunks (lists of tuples) and
+# yields bytes, so only one chunk is ever held in memory.
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return str(value)
+
+
+def iter_csv(columns, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([c.name for c in columns])
+    for chunk in chunks:
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def iter_ndjson(columns, chunks):
+    names = [c.name for c in columns]
+    for chunk in chunks:
+        lines = [json.dumps(dict(zip(names, row)), default=_json_default) for row in chunk]
+        yield ("\n".join(lines) + "\n").encode()
+
+
+class _DrainableSink(io.RawIOBase):
+    # Write-only file object that hands back whatever was written since the last drain
+    def __init__(self):
+        self._parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def _arrow_schema(columns):
+    import pyarrow as pa
+    arrow_types = {
+        bool: pa.bool_(),
+        int: pa.int64(),
+        float: pa.float64(),
+        str: pa.string(),
+        datetime.datetime: pa.timestamp("us"),
+        datetime.date: pa.date32(),
+    }
+    fields = []
+    for column in columns:
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            python_type = str
+        fields.append(pa.field(column.name, arrow_types.get(python_type, pa.string())))
+    return pa.schema(fields)
+
+
+def iter_parquet(columns, chunks):
+    # One row group per chunk; pyarrow is optional and only needed here
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(columns)
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for chunk in chunks:
+        table = pa.Table.from_pydict(
+            {field.name: [row[i] for row in chunk] for i, field in enumerate(schema)}, schema=schema
+        )
+        writer.write_table(table)
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    yield sink.drain()
+
+
+ENCODERS = {
+    "csv": iter_csv,
+    "ndjson": iter_ndjson,
+    "parquet": iter_parquet,
+}
@@ -0,0 +1,140 @@
+import datetime
+import numpy as np
+import pytz
+
+# Black-76 pricing, implied volatility and Greeks for options on NIFTY futures.
+# Everything here works on NumPy arrays so a whole option chain is solved in
+# one batched call (scalars are accepted too and broadcast as usual).
+
+IST = pytz.timezone('Asia/Kolkata')
+EXPIRY_TIME = datetime.time(15, 30)
+
+RISK_FREE_RATE = 0.065
+YEAR_SECONDS = 365.0 * 24 * 60 * 60
+MIN_T = 1e-6  # ~30 seconds, keeps d1/d2 finite on expiry day
+
+IV_LOW = 1e-4
+IV_HIGH = 5.0
+IV_TOL = 1e-6
+IV_MAX_ITER = 50
+
+_SQRT_2PI = np.sqrt(2.0 * np.pi)
+
+
+def norm_pdf(x):
+    return np.exp(-0.5 * x * x) / _SQRT_2PI
+
+
+def norm_cdf(x):
+    # Abramowitz & Stegun 26.2.17, abs error < 7.5e-8. Avoids a scipy dependency.
+    x = np.asarray(x, dtype=float)
+    t = 1.0 / (1.0 + 0.2316419 * np.abs(x))
+    poly = t * (0.319381530 + t * (-0.356563782 + t * (1.781477937 + t * (-1.821255978 + t * 1.330274429))))
+    upper = 1.0 - norm_pdf(x) * poly
+    return np.where(x >= 0, upper, 1.0 - upper)
+
+
+def time_to_expiry(expiry, now):
+    # NIFTY options expire at 15:30 IST on the expiry date
+    if isinstance(expiry, datetime.datetime):
+        expiry = expiry.date()
+    expiry_dt = IST.localize(datetime.datetime.combine(expiry, EXPIRY_TIME))
+    return max((expiry_dt - now.astimezone(IST)).total_seconds() / YEAR_SECONDS, MIN_T)
+
+
+def _d1_d2(F, K, T, sigma):
+    sqrt_t = np.sqrt(T)
+    vol_t = sigma * sqrt_t
+    d1 = (np.log(F / K) + 0.5 * sigma * sigma * T) / vol_t
+    return d1, d1 - vol_t, sqrt_t
+
+
+def black76_price(F, K, T, sigma, is_call, r=RISK_FREE_RATE):
+    F, K, T, sigma = (np.asarray(a, dtype=float) for a in (F, K, T, sigma))
+    T = np.maximum(T, MIN_T)
+    d1, d2, _ = _d1_d2(F, K, T, sigma)
+    disc = np.exp(-r * T)
+    call = disc * (F * norm_cdf(d1) - K * norm_cdf(d2))
+    put = disc * (K * norm_cdf(-d2) - F * norm_cdf(-d1))
+    return np.where(is_call, call, put)
+
+
+def implied_vol(price, F, K, T, is_call, r=RISK_FREE_RATE):
+    # Newton-Raphson safeguarded by a bisection bracket, run on the whole chain
+    # at once. Points whose premium is outside the no-arbitrage bounds get NaN.
+    price, F, K, T = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in (price, F, K, T)))
+    is_call = np.broadcast_to(np.asarray(is_call, dtype=bool), price.shape)
+    T = np.maximum(T, MIN_T)
+    disc = np.exp(-r * T)
+
+    intrinsic = disc * np.where(is_call, np.maximum(F - K, 0.0), np.maximum(K - F, 0.0))
+    upper = disc * np.where(is_call, F, K)
+    valid = (price > intrinsic) & (price < upper) & (F > 0) & (K > 0)
+
+    lo = np.full(price.shape, IV_LOW)
+    hi = np.full(price.shape, IV_HIGH)
+    sigma = np.full(price.shape, 0.2)
+    active = valid.copy()
+
+    for _ in range(IV_MAX_ITER):
+        if not active.any():
+            break
+        d1, _, sqrt_t = _d1_d2(F, K, T, sigma)
+        diff = black76_price(F, K, T, sigma, is_call, r) - price
+        vega = disc * F * norm_pdf(d1) * sqrt_t
+
+        active &= np.abs(diff) > IV_TOL
+        # Price is increasing in sigma, so the sign of diff tightens the bracket
+        hi = np.where(active & (diff > 0), sigma, hi)
+        lo = np.where(active & (diff < 0), sigma, lo)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            newton = sigma - diff / vega
+        bisect = 0.5 * (lo + hi)
+        step = np.where((newton > lo) & (newton < hi) & np.isfinite(newton), newton, bisect)
+        sigma = np.where(active, step, sigma)
+
+    return np.where(valid, sigma, np.nan)
+
+
+def greeks(F, K, T, sigma, is_call, r=RISK_FREE_RATE):
+    # Delta is with respect to the futures price. Vega is per 1 vol point
+    # (1%), theta is per calendar day.
+    F, K, T, sigma = (np.asarray(a, dtype=float) for a in (F, K, T, sigma))
+    T = np.maximum(T, MIN_T)
+    d1, d2, sqrt_t = _d1_d2(F, K, T, sigma)
+    disc = np.exp(-r * T)
+    pdf_d1 = norm_pdf(d1)
+
+    price = black76_price(F, K, T, sigma, is_call, r)
+    delta = np.where(is_call, disc * norm_cdf(d1), -disc * norm_cdf(-d1))
+    gamma = disc * pdf_d1 / (F * sigma * sqrt_t)
+    vega = disc * F * pdf_d1 * sqrt_t
+    theta = -disc * F * pdf_d1 * sigma / (2.0 * sqrt_t) + r * price
+
+    return {
+        "price": price,
+        "delta": delta,
+        "gamma": gamma,
+        "theta": theta / 365.0,
+        "vega": vega / 100.0,
+    }
+
+
+def chain_greeks(prices, F, K, T, is_call, r=RISK_FREE_RATE):
+    # Solve IV and Greeks for a full chain in one call
+    iv = implied_vol(prices, F, K, T, is_call, r)
+    result = greeks(F, K, T, iv, is_call, r)
+    result["iv"] = iv
+    return result
+
+
+def select_by_delta(strikes, prices, F, T, is_call, target_delta, r=RISK_FREE_RATE):
+    # Index of the strike whose |delta| is closest to target_delta, or None
+    # when no strike in the chain has a solvable IV.
+    strikes = np.asarray(strikes, dtype=float)
+    result = chain_greeks(prices, F, strikes, T, is_call, r)
+    distance = np.abs(np.abs(result["delta"]) - abs(target_delta))
+    if np.all(np.isnan(distance)):
+        return None, result
+    return int(np.nanargmin(distance)), result
@@ -1,18 +1,38 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+import os
+import datetime
+import importlib.util
+from contextlib import asynccontextmanager
+from typing import Optional, List
+from fastapi import FastAPI, Depends, HTTPException, Query, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from sqlalchemy import inspect, text
 from sqlalchemy.orm import Session
-from . import crud, models, schemas, database, trading_engine
+from . import crud, models, schemas, database, trading_engine, export, risk
 from .database import engine
-from kiteconnect import KiteConnect
-from apscheduler.schedulers.background import BackgroundScheduler
-import pytz
-import uvicorn
 import logging
 
-models.Base.metadata.create_all(bind=engine)
+logger = logging.getLogger("API")
 
-app = FastAPI()
+# Schema setup is an explicit step: run `python -m backend.migrate` before starting the API
+# (the container entrypoint does). The engine starts with the app unless ENGINE_AUTOSTART is
+# turned off, in which case use /api/engine/start.
+ENGINE_AUTOSTART = os.getenv("ENGINE_AUTOSTART", "true").lower() in ("1", "true", "yes")
+
+engine_instance = trading_engine.TradingEngine()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logger.info(f"API starting (engine autostart: {ENGINE_AUTOSTART})")
+    if ENGINE_AUTOSTART:
+        # Safe on every worker and task: only the lease holder trades
+        engine_instance.start()
+    yield
+    logger.info("API shutting down, stopping engine")
+    engine_instance.stop()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -22,14 +42,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Scheduler for Trading Engine
-scheduler = BackgroundScheduler(timezone=pytz.timezone('Asia/Kolkata'))
-engine_instance = trading_engine.TradingEngine()
-
-# Run strategy every 1 minute (For testing, maybe 5 min in prod)
-scheduler.add_job(engine_instance.run_strategy, 'interval', minutes=1)
-scheduler.start()
-
 # Dependency
 def get_db():
     db = database.SessionLocal()
@@ -93,6 +105,7 @@ def generate_token(
         raise HTTPException(status_code=400, detail="API Key and Secret must be set first")
     
     try:
+        from kiteconnect import KiteConnect
         kite = KiteConnect(api_key=current_user.api_key)
         data = kite.generate_session(request_token, api_secret=current_user.api_secret)
         access_token = data["access_token"]
@@ -113,5 +126,155 @@ def toggle_trading_endpoint(
 def get_trades(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
     return crud.get_user_trades(db, current_user.id)
 
+@app.get("/api/trades/export")
+def export_trades(
+    format: str = "csv",
+    scope: str = "me",
+    group_by: Optional[str] = None,
+    start_date: Optional[datetime.date] = None,
+    end_date: Optional[datetime.date] = None,
+    current_user: models.User = Depends(get_current_user),
+):
+    # Full trade history streamed in chunks from a server-side cursor, so
+    # memory stays flat however many trades are exported
+    if format not in export.ENCODERS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(export.ENCODERS)}")
+    if format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        raise HTTPException(status_code=400, detail="Parquet export requires pyarrow on the server")
+    if scope not in ("me", "all"):
+        raise HTTPException(status_code=400, detail="scope must be 'me' or 'all'")
+    if scope == "all" and not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    if group_by is not None and group_by not in crud.TRADE_GROUPINGS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {', '.join(crud.TRADE_GROUPINGS)}")
+
+    user_id = current_user.id if scope == "me" else None
+    start = datetime.datetime.combine(start_date, datetime.time.min) if start_date else None
+    end = datetime.datetime.combine(end_date + datetime.timedelta(days=1), datetime.time.min) if end_date else None
+
+    def stream():
+        # Own session: the request-scoped one may be closed before streaming finishes
+        db = database.SessionLocal()
+        try:
+            if group_by:
+                columns, chunks = crud.stream_trade_aggregates(db, group_by, user_id, start, end)
+            else:
+                columns, chunks = crud.stream_trades(db, user_id, start, end)
+            yield from export.ENCODERS[format](columns, chunks)
+        finally:
+            db.close()
+
+    filename = f"trades_{group_by}.{format}" if group_by else f"trades.{format}"
+    return StreamingResponse(
+        stream(),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@app.get("/api/trades/greeks")
+def get_open_trade_greeks(current_user: models.User = Depends(get_current_user)):
+    # Latest Greeks computed by the engine for the user's open positions
+    return [g for g in engine_instance.position_greeks.values() if g["user_id"] == current_user.id]
+
+@app.get("/api/risk/status")
+def risk_status(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    return _risk_status(db, current_user)
+
+def _risk_status(db: Session, user: models.User):
+    result = engine_instance.risk.status(user.id, user)
+    # The stored switch is authoritative; this process may not be running the engine
+    result["global_kill_switch"] = crud.get_global_kill_switch(db)
+    return result
+
+@app.post("/api/risk/limits")
+def update_risk_limits(
+    max_daily_loss: Optional[float] = None,
+    max_trades_per_day: Optional[int] = None,
+    max_open_notional: Optional[float] = None,
+    reset: List[str] = Query([]),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Only the limits passed are changed; limits named in `reset`
+    # (e.g. ?reset=max_trades_per_day) go back to the engine defaults
+    given = {"max_daily_loss": max_daily_loss, "max_trades_per_day": max_trades_per_day, "max_open_notional": max_open_notional}
+    updates = {name: value for name, value in given.items() if value is not None}
+    for name, value in updates.items():
+        if value < 0:
+            raise HTTPException(status_code=400, detail=f"{name} must not be negative")
+    unknown = set(reset) - set(risk.LIMIT_DEFAULTS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"reset must name one of {', '.join(risk.LIMIT_DEFAULTS)}")
+    if set(reset) & set(updates):
+        raise HTTPException(status_code=400, detail="A limit cannot be set and reset in the same call")
+    updates.update({name: None for name in reset})
+    if not updates:
+        raise HTTPException(status_code=400, detail="No limits given")
+
+    user = crud.update_risk_limits(db, current_user.id, updates)
+    engine_instance.risk.sync_user(user)
+    return _risk_status(db, user)
+
+@app.post("/api/risk/kill_switch")
+def user_kill_switch(
+    active: bool,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Blocks new entries for this user; exits keep running
+    crud.set_kill_switch(db, current_user.id, active)
+    engine_instance.risk.set_kill_switch(current_user.id, active)
+    return _risk_status(db, current_user)
+
+@app.post("/api/risk/global_kill_switch")
+def global_kill_switch(
+    active: bool,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Blocks new entries for every user. Stored in the DB, so it survives
+    # restarts and reaches the engine whichever worker handles the request;
+    # the engine picks it up at the start of its next run
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    settings = crud.set_global_kill_switch(db, active)
+    engine_instance.risk.global_kill_switch = active
+    return {"global_kill_switch": settings.global_kill_switch, "updated_at": settings.updated_at}
+
+@app.get("/api/health/live")
+def liveness():
+    return {"status": "ok"}
+
+@app.get("/api/health/ready")
+def readiness():
+    # Ready once the database is reachable and migrations have been applied
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        if not inspect(engine).has_table(models.User.__tablename__):
+            raise RuntimeError("database schema missing, run migrations")
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    return {"status": "ready", "engine_running": engine_instance.is_running, "engine_leader": engine_instance.is_leader}
+
+@app.get("/api/engine/status")
+def engine_status(current_user: models.User = Depends(get_current_user)):
+    return engine_instance.status()
+
+@app.post("/api/engine/start")
+def engine_start(current_user: models.User = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    # Starts this process's engine; it trades once it holds the shared lease
+    return engine_instance.start()
+
+@app.post("/api/engine/stop")
+def engine_stop(current_user: models.User = Depends(get_current_user)):
+    # The engine trades for every user, so only admins may stop it
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return engine_instance.stop()
+
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
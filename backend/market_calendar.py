@@ -0,0 +1,116 @@
+import os
+import datetime
+import logging
+import pytz
+
+# NSE trading calendar: session hours, weekends and exchange holidays.
+# Holidays are read from a plain text file (one ISO date per line, '#' starts
+# a comment) so the list can be updated from the NSE circular without a deploy.
+
+logger = logging.getLogger("MarketCalendar")
+
+IST = pytz.timezone('Asia/Kolkata')
+SESSION_OPEN = datetime.time(9, 15)
+SESSION_CLOSE = datetime.time(15, 30)
+
+HOLIDAYS_FILE = os.getenv(
+    "MARKET_HOLIDAYS_FILE", os.path.join(os.path.dirname(__file__), "market_holidays.txt")
+)
+
+# Kite historical interval -> candle length in minutes
+INTERVAL_MINUTES = {
+    "minute": 1,
+    "3minute": 3,
+    "5minute": 5,
+    "10minute": 10,
+    "15minute": 15,
+    "30minute": 30,
+    "60minute": 60,
+}
+
+_holidays = None
+
+
+def load_holidays(path=HOLIDAYS_FILE):
+    # A bad line is logged and skipped rather than raised, since this runs
+    # inside the scheduler triggers
+    holidays = set()
+    if not os.path.exists(path):
+        logger.warning(f"Holiday file {path} not found, only weekends will be skipped")
+        return holidays
+    with open(path) as f:
+        for number, line in enumerate(f, start=1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            try:
+                holidays.add(datetime.date.fromisoformat(line))
+            except ValueError:
+                logger.error(f"Skipping invalid holiday date {line!r} at {path}:{number}")
+    return holidays
+
+
+def get_holidays():
+    global _holidays
+    if _holidays is None:
+        _holidays = load_holidays()
+    return _holidays
+
+
+def is_trading_day(day):
+    return day.weekday() < 5 and day not in get_holidays()
+
+
+def next_trading_day(day):
+    # First trading day on or after `day`
+    while not is_trading_day(day):
+        day += datetime.timedelta(days=1)
+    return day
+
+
+def is_market_open(now):
+    now = now.astimezone(IST)
+    return is_trading_day(now.date()) and SESSION_OPEN <= now.time() <= SESSION_CLOSE
+
+
+def interval_minutes(interval):
+    if interval not in INTERVAL_MINUTES:
+        raise ValueError(f"Unsupported candle interval: {interval}")
+    return INTERVAL_MINUTES[interval]
+
+
+def candle_closes(day, interval):
+    # Close times of every candle in the session; candles are anchored at the
+    # open and the last one is cut short at the session close if needed
+    minutes = interval_minutes(interval)
+    open_dt = IST.localize(datetime.datetime.combine(day, SESSION_OPEN))
+    close_dt = IST.localize(datetime.datetime.combine(day, SESSION_CLOSE))
+    closes = []
+    current = open_dt + datetime.timedelta(minutes=minutes)
+    while current < close_dt:
+        closes.append(current)
+        current += datetime.timedelta(minutes=minutes)
+    closes.append(close_dt)
+    return closes
+
+
+def next_candle_close(after, interval, delay=datetime.timedelta(0)):
+    # First candle close (plus delay) strictly after `after`, on a trading day
+    after = after.astimezone(IST)
+    day = next_trading_day(after.date())
+    while True:
+        for close in candle_closes(day, interval):
+            if close + delay > after:
+                return close + delay
+        day = next_trading_day(day + datetime.timedelta(days=1))
+
+
+def next_session_time(after, at):
+    # Next trading-day datetime at wall-clock time `at` strictly after `after`
+    after = after.astimezone(IST)
+    day = next_trading_day(after.date())
+    while True:
+        candidate = IST.localize(datetime.datetime.combine(day, at))
+        if candidate > after:
+            return candidate
+        day = next_trading_day(day + datetime.timedelta(days=1))
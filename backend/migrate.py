@@ -0,0 +1,58 @@
+import argparse
+import sys
+from sqlalchemy import inspect, text
+from . import models
+from .database import engine, SessionLocal
+
+# Explicit schema setup, run once per deploy before starting the API:
+#   python -m backend.migrate
+# Grant or revoke admin rights (engine control, global kill switch, all-user export):
+#   python -m backend.migrate --make-admin <username>
+#   python -m backend.migrate --revoke-admin <username>
+
+def add_missing_columns():
+    # create_all only creates new tables; add columns introduced since an
+    # existing table was created (nullable, with the model's scalar default)
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in models.Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+                if column.default is not None and column.default.is_scalar:
+                    ddl += f" DEFAULT {column.default.arg!r}"
+                conn.execute(text(ddl))
+
+def set_admin(username: str, is_admin: bool):
+    db = SessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.username == username).first()
+        if user is None:
+            return False
+        user.is_admin = is_admin
+        db.commit()
+        return True
+    finally:
+        db.close()
+
+def run():
+    models.Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply schema migrations and manage admin users")
+    parser.add_argument("--make-admin", metavar="USERNAME", help="grant admin rights to an existing user")
+    parser.add_argument("--revoke-admin", metavar="USERNAME", help="revoke admin rights from a user")
+    args = parser.parse_args()
+
+    run()
+    for username, is_admin in ((args.make_admin, True), (args.revoke_admin, False)):
+        if username is None:
+            continue
+        if not set_admin(username, is_admin):
+            sys.exit(f"No user named {username!r}; register it first via /api/register")
+        print(f"{'Granted' if is_admin else 'Revoked'} admin rights for {username}")
@@ -20,6 +20,14 @@ class User(Base):
     is_trading_active = Column(Boolean, default=False)
     num_lots = Column(Integer, default=1)
     
+    is_admin = Column(Boolean, default=False)
+    
+    # Risk Limits (None falls back to the defaults in risk.py)
+    kill_switch = Column(Boolean, default=False)
+    max_daily_loss = Column(Float, nullable=True)
+    max_trades_per_day = Column(Integer, nullable=True)
+    max_open_notional = Column(Float, nullable=True)
+    
     trades = relationship("Trade", back_populates="owner")
 
 class Trade(Base):
@@ -41,3 +49,19 @@ class Trade(Base):
     reason = Column(String, nullable=True)
     
     owner = relationship("User", back_populates="trades")
+
+class RiskSettings(Base):
+    __tablename__ = "risk_settings"
+
+    # Single row of process-independent risk switches, read by the engine each run
+    id = Column(Integer, primary_key=True)
+    global_kill_switch = Column(Boolean, default=False)
+    updated_at = Column(DateTime, nullable=True)
+
+class EngineLease(Base):
+    __tablename__ = "engine_lease"
+
+    # Single row: whichever process holds an unexpired lease runs the trading jobs
+    id = Column(Integer, primary_key=True)
+    holder = Column(String)
+    expires_at = Column(DateTime)
@@ -0,0 +1,161 @@
+import datetime
+import threading
+
+# Pre-trade risk checks kept entirely in memory. Counters are seeded once per
+# user from the trades table and then updated incrementally on every fill and
+# close, so check_order() is a handful of comparisons with no DB round trip.
+
+# Defaults used when a user has not set their own limit
+MAX_DAILY_LOSS = 10000.0       # Realized loss (₹) after which new entries stop for the day
+MAX_TRADES_PER_DAY = 10
+MAX_OPEN_NOTIONAL = 200000.0   # Premium (₹) held in open positions
+MIN_ORDER_INTERVAL = datetime.timedelta(seconds=60) # Duplicate-order guard
+
+# User columns holding per-user overrides of the defaults above
+LIMIT_DEFAULTS = {
+    "max_daily_loss": MAX_DAILY_LOSS,
+    "max_trades_per_day": MAX_TRADES_PER_DAY,
+    "max_open_notional": MAX_OPEN_NOTIONAL,
+}
+
+
+def effective_limits(user):
+    # The user's own limit where set, the default otherwise
+    limits = {}
+    for name, default in LIMIT_DEFAULTS.items():
+        value = getattr(user, name)
+        limits[name] = value if value is not None else default
+    return limits
+
+
+class UserRiskState:
+    __slots__ = (
+        "day", "realized_pnl", "trades_today", "open_notional", "open_positions",
+        "last_order_at", "kill_switch", "max_daily_loss", "max_trades_per_day", "max_open_notional",
+    )
+
+    def __init__(self, day):
+        self.day = day
+        self.realized_pnl = 0.0
+        self.trades_today = 0
+        self.open_notional = 0.0
+        self.open_positions = {} # trade_id -> notional
+        self.last_order_at = None
+        self.kill_switch = False
+        self.max_daily_loss = MAX_DAILY_LOSS
+        self.max_trades_per_day = MAX_TRADES_PER_DAY
+        self.max_open_notional = MAX_OPEN_NOTIONAL
+
+    def roll_day(self, day):
+        # Daily counters reset; open positions carry over
+        if day != self.day:
+            self.day = day
+            self.realized_pnl = 0.0
+            self.trades_today = 0
+
+
+class RiskEngine:
+    def __init__(self):
+        self.global_kill_switch = False
+        self._states = {} # user_id -> UserRiskState
+        self._lock = threading.Lock()
+
+    def is_loaded(self, user_id):
+        return user_id in self._states
+
+    def load_user(self, user_id, day, realized_pnl, trades_today, open_positions):
+        # Seed counters from the DB (see crud.get_risk_snapshot); done once per user
+        state = UserRiskState(day)
+        state.realized_pnl = realized_pnl
+        state.trades_today = trades_today
+        state.open_positions = dict(open_positions)
+        state.open_notional = sum(state.open_positions.values())
+        with self._lock:
+            self._states[user_id] = state
+        return state
+
+    def sync_user(self, user):
+        # Per-user limits and kill switch come from the user row the engine
+        # already loads each run, so API changes apply on the next candle
+        state = self._states.get(user.id)
+        if state is None:
+            return None
+        state.kill_switch = bool(user.kill_switch)
+        for name, value in effective_limits(user).items():
+            setattr(state, name, value)
+        return state
+
+    def check_order(self, user_id, notional, now):
+        # Returns None when the order may go out, otherwise the rejection reason
+        if self.global_kill_switch:
+            return "Global kill switch active"
+        state = self._states.get(user_id)
+        if state is None:
+            return "Risk state not loaded"
+        state.roll_day(now.date())
+        if state.kill_switch:
+            return "User kill switch active"
+        if state.realized_pnl <= -state.max_daily_loss:
+            return f"Daily loss limit reached ({state.realized_pnl:.2f})"
+        if state.trades_today >= state.max_trades_per_day:
+            return f"Max trades per day reached ({state.trades_today})"
+        if state.open_notional + notional > state.max_open_notional:
+            return f"Open exposure limit exceeded ({state.open_notional + notional:.2f})"
+        if state.last_order_at is not None and now - state.last_order_at < MIN_ORDER_INTERVAL:
+            return "Duplicate order within minimum order interval"
+        return None
+
+    def on_fill(self, user_id, trade_id, notional, now):
+        state = self._states.get(user_id)
+        if state is None:
+            return
+        with self._lock:
+            state.roll_day(now.date())
+            state.trades_today += 1
+            state.open_positions[trade_id] = notional
+            state.open_notional += notional
+            state.last_order_at = now
+
+    def on_close(self, user_id, trade_id, pnl, now):
+        state = self._states.get(user_id)
+        if state is None:
+            return
+        with self._lock:
+            state.roll_day(now.date())
+            state.open_notional -= state.open_positions.pop(trade_id, 0.0)
+            state.realized_pnl += pnl or 0.0
+
+    def reset(self):
+        # Forget every user's counters so they are re-seeded from the DB; used
+        # when this process stops leading and another may trade meanwhile.
+        # The global kill switch is kept.
+        with self._lock:
+            self._states.clear()
+
+    def set_kill_switch(self, user_id, active):
+        state = self._states.get(user_id)
+        if state is not None:
+            state.kill_switch = active
+
+    def status(self, user_id, user=None):
+        # Counters are only known where they are loaded (the engine leader);
+        # elsewhere the stored limits and kill switch come from the user row
+        state = self._states.get(user_id)
+        result = {"global_kill_switch": self.global_kill_switch, "loaded": state is not None}
+        if state is None and user is not None:
+            result["kill_switch"] = bool(user.kill_switch)
+            result.update(effective_limits(user))
+        if state is not None:
+            result.update({
+                "day": state.day,
+                "realized_pnl": state.realized_pnl,
+                "trades_today": state.trades_today,
+                "open_notional": state.open_notional,
+                "open_positions": len(state.open_positions),
+                "last_order_at": state.last_order_at,
+                "kill_switch": state.kill_switch,
+                "max_daily_loss": state.max_daily_loss,
+                "max_trades_per_day": state.max_trades_per_day,
+                "max_open_notional": state.max_open_notional,
+            })
+        return result
@@ -42,6 +42,11 @@ class User(UserBase):
     id: int
     is_trading_active: bool
     num_lots: int
+    is_admin: Optional[bool] = False
+    kill_switch: Optional[bool] = False
+    max_daily_loss: Optional[float] = None
+    max_trades_per_day: Optional[int] = None
+    max_open_notional: Optional[float] = None
     trades: List[Trade] = []
     api_key: Optional[str] = None # Should probably hide this in real app, but ok for now
     api_secret: Optional[str] = None
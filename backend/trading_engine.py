@@ -1,14 +1,19 @@
+import os
 import time
+import uuid
+import socket
+import math
 import datetime
+import threading
 import pytz
-import pandas as pd
-import pandas_ta as ta
-from kiteconnect import KiteConnect
 from sqlalchemy.orm import Session
-from . import crud, models, schemas
+from . import crud, models, schemas, market_calendar, risk
 from .database import SessionLocal
 import logging
 
+# pandas, pandas_ta, kiteconnect, numpy (greeks) and apscheduler are imported
+# lazily where they are used, so importing this module stays cheap.
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("TradingEngine")
@@ -22,12 +27,174 @@ ST_PERIOD = 10
 ST_MULTIPLIER = 3
 SL_PCT = 0.14
 TP_PCT = 0.18
-START_TIME = datetime.time(9, 15)
-END_TIME = datetime.time(15, 30)
+START_TIME = market_calendar.SESSION_OPEN
+END_TIME = market_calendar.SESSION_CLOSE
+HISTORY_DAYS = 5
+LOT_SIZE = 65 # NIFTY Lot size (as in the backtest)
+
+# Strike Selection: "offset" picks fut_ltp -/+ STRIKE_OFFSET (ITM),
+# "delta" picks the strike whose |delta| is closest to TARGET_DELTA
+STRIKE_SELECTION = "offset"
+STRIKE_OFFSET = 200
+STRIKE_STEP = 50
+TARGET_DELTA = 0.6
+DELTA_CHAIN_WIDTH = 20 # Strikes on each side of ATM priced for delta selection
+
+# Scheduling: the strategy runs just after each candle of every interval in
+# STRATEGY_INTERVALS closes, TP/SL exits are checked on every EXIT_INTERVAL
+# close, and caches are warmed before the open. Nothing fires on weekends or
+# exchange holidays (see market_calendar).
+STRATEGY_INTERVALS = [INTERVAL]
+EXIT_INTERVAL = "minute"
+CANDLE_CLOSE_DELAY = datetime.timedelta(milliseconds=300)
+WARMUP_TIME = datetime.time(9, 0)
+# Jobs firing just after the 15:30 close still belong to the session
+SESSION_GRACE = datetime.timedelta(minutes=1)
+
+# Engine Lifecycle
+# Every API process may start the engine, but only the holder of the lease
+# row in the shared database schedules the trading jobs; the others stay on
+# standby and take over if the holder stops renewing (crash, scale-in).
+ENGINE_LEASE_SECONDS = 30
+ENGINE_LEASE_RENEW_SECONDS = 10
+TRADING_JOB_IDS = ("check_exits", "warm_up")
 
 class TradingEngine:
     def __init__(self):
-        self.is_running = False
+        self.is_running = False # Scheduler running (leader or standby)
+        self.is_leader = False # Holds the lease and runs the trading jobs
+        self.holder_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.position_greeks = {} # trade_id -> latest Greeks of the open position
+        self.scheduler = None
+        self.started_at = None
+        self.last_run_at = None
+        self._lock = threading.Lock()
+        # Strategy and exit jobs can fire on the same candle close; they take
+        # turns so a position is never exited or entered twice
+        self._run_lock = threading.Lock()
+        self.risk = risk.RiskEngine()
+        # Caches filled by warm_up() and reused on every run
+        self._sessions = {} # user_id -> (access_token, KiteConnect)
+        self._instruments = None # (date, NFO instruments DataFrame), shared by all users
+        self._history = {} # (instrument_token, interval) -> DataFrame of closed candles
+
+    def start(self):
+        with self._lock:
+            if self.is_running:
+                return self.status()
+
+            from apscheduler.schedulers.background import BackgroundScheduler
+            self.scheduler = BackgroundScheduler(timezone=IST)
+            self.scheduler.add_job(
+                self.maintain_lease, 'interval', seconds=ENGINE_LEASE_RENEW_SECONDS,
+                id="engine_lease", max_instances=1, coalesce=True
+            )
+            self.scheduler.start()
+            self.is_running = True
+            self.started_at = datetime.datetime.now(IST)
+            logger.info(f"Trading Engine started (holder {self.holder_id})")
+        self.maintain_lease()
+        return self.status()
+
+    def stop(self):
+        with self._lock:
+            if self.scheduler is not None:
+                self.scheduler.shutdown(wait=False)
+                self.scheduler = None
+            if self.is_leader:
+                self._release_lease()
+            if self.is_running:
+                logger.info("Trading Engine stopped")
+            self.is_running = False
+            self.is_leader = False
+            self.started_at = None
+            self._clear_caches()
+            return self.status()
+
+    def maintain_lease(self):
+        # Renew (or try to take) the lease and add/remove the trading jobs to match
+        with self._lock:
+            if self.scheduler is None:
+                return
+            db = SessionLocal()
+            try:
+                acquired = crud.acquire_engine_lease(db, self.holder_id, ENGINE_LEASE_SECONDS)
+            except Exception as e:
+                logger.error(f"Engine lease check failed: {e}")
+                acquired = False
+            finally:
+                db.close()
+
+            if acquired and not self.is_leader:
+                self.is_leader = True
+                self._add_trading_jobs()
+                logger.info(f"Trading Engine acquired lease (holder {self.holder_id})")
+            elif not acquired and self.is_leader:
+                self.is_leader = False
+                self._remove_trading_jobs()
+                self._clear_caches()
+                logger.warning(f"Trading Engine lost lease (holder {self.holder_id}), now on standby")
+
+    def _release_lease(self):
+        db = SessionLocal()
+        try:
+            crud.release_engine_lease(db, self.holder_id)
+        except Exception as e:
+            logger.error(f"Engine lease release failed: {e}")
+        finally:
+            db.close()
+
+    def _add_trading_jobs(self):
+        from .triggers import CandleCloseTrigger, TradingDayTrigger
+        now_ist = datetime.datetime.now(IST)
+        for interval in STRATEGY_INTERVALS:
+            self.scheduler.add_job(
+                self.run_strategy, CandleCloseTrigger(interval, CANDLE_CLOSE_DELAY), args=[interval],
+                id=f"run_strategy_{interval}", max_instances=1, coalesce=True
+            )
+        self.scheduler.add_job(
+            self.check_exits, CandleCloseTrigger(EXIT_INTERVAL, CANDLE_CLOSE_DELAY),
+            id="check_exits", max_instances=1, coalesce=True
+        )
+        # Took over after the warm-up time on a trading day: warm up right away,
+        # then follow the daily trigger
+        warm_up_now = market_calendar.is_trading_day(now_ist.date()) and WARMUP_TIME <= now_ist.time() <= END_TIME
+        self.scheduler.add_job(
+            self.warm_up, TradingDayTrigger(WARMUP_TIME),
+            id="warm_up", max_instances=1, coalesce=True,
+            **({"next_run_time": now_ist} if warm_up_now else {})
+        )
+
+    def _remove_trading_jobs(self):
+        job_ids = list(TRADING_JOB_IDS) + [f"run_strategy_{interval}" for interval in STRATEGY_INTERVALS]
+        for job_id in job_ids:
+            if self.scheduler.get_job(job_id):
+                self.scheduler.remove_job(job_id)
+
+    def _clear_caches(self):
+        self._sessions.clear()
+        self._history.clear()
+        self._instruments = None
+        # Positions may be managed (and closed) by another leader from now on,
+        # so Greeks go and risk counters are re-seeded on the next takeover
+        self.position_greeks.clear()
+        self.risk.reset()
+
+    def status(self):
+        jobs = {}
+        if self.scheduler is not None:
+            jobs = {job.id: job.next_run_time for job in self.scheduler.get_jobs() if job.id != "engine_lease"}
+        next_runs = [t for t in jobs.values() if t is not None]
+        return {
+            "running": self.is_running,
+            "leader": self.is_leader,
+            "holder": self.holder_id,
+            "pid": os.getpid(),
+            "started_at": self.started_at,
+            "last_run_at": self.last_run_at,
+            "next_run_at": min(next_runs) if next_runs else None,
+            "jobs": jobs,
+        }
     
     def get_db(self):
         db = SessionLocal()
@@ -66,227 +233,417 @@ class TradingEngine:
         # Heuristic: Get all instruments, filter by NIFTY, find current expiry.
         return None # To be implemented with live data check
 
-    def run_strategy(self):
-        # Check Trading Hours (IST)
+    def get_kite(self, user):
+        from kiteconnect import KiteConnect
+        cached = self._sessions.get(user.id)
+        if cached and cached[0] == user.access_token:
+            return cached[1]
+        kite = KiteConnect(api_key=user.api_key)
+        kite.set_access_token(user.access_token)
+        self._sessions[user.id] = (user.access_token, kite)
+        return kite
+
+    def get_instruments(self, kite, today):
+        # The NFO instrument dump changes once a day, so it is fetched once and shared
+        import pandas as pd
+        if self._instruments is None or self._instruments[0] != today:
+            self._instruments = (today, pd.DataFrame(kite.instruments("NFO")))
+        return self._instruments[1]
+
+    def get_nifty_future(self, df_inst):
+        nifty_futs = df_inst[(df_inst['name'] == 'NIFTY') & (df_inst['segment'] == 'NFO-FUT')]
+        if nifty_futs.empty:
+            return None
+        return nifty_futs.sort_values('expiry').iloc[0] # Nearest expiry
+
+    def get_history(self, kite, token, interval, now_ist):
+        # Closed candles only. After the first load just the candles since the
+        # last cached one are fetched and appended.
+        import pandas as pd
+        key = (token, interval)
+        cached = self._history.get(key)
+        if cached is None or cached.empty:
+            from_date = now_ist - datetime.timedelta(days=HISTORY_DAYS)
+        else:
+            from_date = cached.index[-1].to_pydatetime()
+
+        data = kite.historical_data(token, from_date, now_ist, interval)
+        df = pd.DataFrame(data)
+        if df.empty:
+            return cached if cached is not None else df
+
+        df['date'] = pd.to_datetime(df['date'])
+        df.set_index('date', inplace=True)
+        # Drop the candle that is still forming
+        candle = pd.Timedelta(minutes=market_calendar.interval_minutes(interval))
+        if now_ist.time() < END_TIME:
+            df = df[df.index + candle <= now_ist]
+        if cached is not None:
+            df = pd.concat([cached, df])
+            df = df[~df.index.duplicated(keep='last')]
+        df = df[df.index >= now_ist - datetime.timedelta(days=HISTORY_DAYS)]
+        self._history[key] = df
+        return df
+
+    def compute_signal(self, df):
+        # Supertrend direction flip on the last closed candle:
+        # 2 means Bullish Flip (-1 -> 1), -2 means Bearish Flip (1 -> -1)
+        import pandas as pd
+        import pandas_ta as ta
+        if len(df) < 2:
+            return None
+        st = ta.supertrend(df["high"], df["low"], df["close"], length=ST_PERIOD, multiplier=ST_MULTIPLIER)
+        if st is None or st.empty:
+            return None
+        dir_cols = [c for c in st.columns if c.startswith("SUPERTd")]
+        if not dir_cols:
+            return None
+        direction = st[dir_cols[0]]
+        return direction.iloc[-1] - direction.iloc[-2]
+
+    def warm_up(self):
+        # Pre-open: import the analytics stack, validate broker sessions and
+        # load instruments and history so the first candle costs no extra time
+        now_ist = datetime.datetime.now(IST)
+        if not market_calendar.is_trading_day(now_ist.date()):
+            return
+        logger.info(f"Trading Engine warm-up (IST): {now_ist}")
+
+        # Pay the heavy import cost now rather than on the first signal
+        import pandas, pandas_ta, kiteconnect
+        from . import greeks
+
+        # Fills the same caches the strategy and exit jobs use, so take turns
+        # with them (the engine can start mid-session)
+        with self._run_lock:
+            self._warm_up(now_ist)
+
+    def _warm_up(self, now_ist):
+        db = SessionLocal()
+        try:
+            active_users = db.query(models.User).filter(models.User.is_trading_active == True).all()
+            self.risk.global_kill_switch = crud.get_global_kill_switch(db)
+            for user in active_users:
+                if not user.access_token or not user.api_key:
+                    continue
+                try:
+                    kite = self.get_kite(user)
+                    kite.profile() # Fails fast on an expired access token
+                    self.ensure_risk_state(db, user, now_ist)
+                    df_inst = self.get_instruments(kite, now_ist.date())
+                    curr_fut = self.get_nifty_future(df_inst)
+                    if curr_fut is None:
+                        continue
+                    for interval in STRATEGY_INTERVALS:
+                        df = self.get_history(kite, curr_fut['instrument_token'], interval, now_ist)
+                        self.compute_signal(df)
+                except Exception as e:
+                    self._sessions.pop(user.id, None)
+                    logger.error(f"Warm-up failed for user {user.username}: {e}")
+        finally:
+            db.close()
+
+    def prune_position_greeks(self, user_id, open_trades):
+        # Drop Greeks of trades that are no longer open (e.g. closed while
+        # another process held the lease)
+        open_ids = {trade.id for trade in open_trades}
+        for trade_id, position in list(self.position_greeks.items()):
+            if position["user_id"] == user_id and trade_id not in open_ids:
+                del self.position_greeks[trade_id]
+
+    def manage_exits(self, kite, db, user, open_trades, df_inst, fut_ltp, now_ist):
+        self.prune_position_greeks(user.id, open_trades)
+
+        # EXIT LOGIC
+        for trade in open_trades:
+            # Check current price of the option
+            # We need the option token.
+            # In our DB we stored symbol. We need to find token again or store it.
+            # For now let's resolve symbol to token.
+            opt_inst = df_inst[df_inst['tradingsymbol'] == trade.symbol]
+            if opt_inst.empty:
+                continue
+            opt_token = opt_inst.iloc[0]['instrument_token']
+            
+            ltp_data = kite.ltp(opt_token)
+            if str(opt_token) not in ltp_data:
+                continue
+                
+            current_price = ltp_data[str(opt_token)]['last_price']
+
+            try:
+                position = self.update_position_greeks(trade, opt_inst.iloc[0], fut_ltp, current_price, now_ist)
+                if position['iv'] is None:
+                    logger.info(f"{trade.symbol} greeks unavailable: no implied vol at LTP {current_price}")
+                else:
+                    logger.info(
+                        f"{trade.symbol} greeks: iv {position['iv']:.3f} delta {position['delta']:.3f} "
+                        f"gamma {position['gamma']:.5f} theta {position['theta']:.2f} vega {position['vega']:.2f}"
+                    )
+            except Exception as e:
+                logger.error(f"Error computing greeks for {trade.symbol}: {e}")
+            
+            exit_trade = False
+            reason = ""
+            
+            # Target / SL
+            if current_price >= trade.entry_price * (1 + TP_PCT):
+                exit_trade = True
+                reason = "Target Hit"
+            elif current_price <= trade.entry_price * (1 - SL_PCT):
+                exit_trade = True
+                reason = "SL Hit"
+            
+            # Trend Reversal
+            # If Long (CE) and Signal becomes Bearish
+                # if "CE" in trade.symbol and last_candle[dir_col] == -1:
+                #     exit_trade = True
+                #     reason = "Trend Reversal"
+                # # If Short (PE) and Signal becomes Bullish
+                # if "PE" in trade.symbol and last_candle[dir_col] == 1:
+                #     exit_trade = True
+                #     reason = "Trend Reversal"
+                
+            if exit_trade:
+                # Place Sell Order
+                try:
+                    order_id = kite.place_order(
+                        variety=kite.VARIETY_REGULAR,
+                        exchange=kite.EXCHANGE_NFO,
+                        tradingsymbol=trade.symbol,
+                        transaction_type=kite.TRANSACTION_TYPE_SELL,
+                        quantity=trade.quantity,
+                        product=kite.PRODUCT_MIS,
+                        order_type=kite.ORDER_TYPE_MARKET
+                    )
+                    logger.info(f"Exited trade {trade.symbol} for user {user.username}: {reason}")
+                    closed = crud.close_trade(db, trade.id, current_price, reason)
+                    self.position_greeks.pop(trade.id, None)
+                    self.risk.on_close(user.id, trade.id, closed.pnl, now_ist)
+                except Exception as e:
+                    logger.error(f"Error closing trade: {e}")
+
+    def ensure_risk_state(self, db, user, now_ist):
+        # Counters are seeded from the DB once (normally at warm-up); after
+        # that only the already-loaded user row is used to refresh limits
+        if not self.risk.is_loaded(user.id):
+            day_start = datetime.datetime.combine(now_ist.date(), datetime.time.min)
+            realized_pnl, trades_today, open_positions = crud.get_risk_snapshot(db, user.id, day_start)
+            self.risk.load_user(user.id, now_ist.date(), realized_pnl, trades_today, open_positions)
+        self.risk.sync_user(user)
+
+    def enter_trade(self, kite, db, user, target_opt, now_ist):
+        symbol = target_opt['tradingsymbol']
+        option_type = target_opt['instrument_type']
+        opt_token = target_opt['instrument_token']
+        try:
+            qty = user.num_lots * LOT_SIZE
+            # Entry price (simplified: using LTP), fetched before the order so
+            # the risk check can size the exposure
+            ltp_data = kite.ltp(opt_token)
+            entry_price = ltp_data[str(opt_token)]['last_price']
+            notional = entry_price * qty
+
+            rejection = self.risk.check_order(user.id, notional, now_ist)
+            if rejection:
+                logger.warning(f"Risk rejected {option_type} entry {symbol} for user {user.username}: {rejection}")
+                return None
+
+            order_id = kite.place_order(
+                variety=kite.VARIETY_REGULAR,
+                exchange=kite.EXCHANGE_NFO,
+                tradingsymbol=symbol,
+                transaction_type=kite.TRANSACTION_TYPE_BUY,
+                quantity=qty,
+                product=kite.PRODUCT_MIS,
+                order_type=kite.ORDER_TYPE_MARKET
+            )
+            
+            trade_data = schemas.TradeCreate(
+                symbol=symbol,
+                entry_price=entry_price,
+                quantity=qty,
+                status="OPEN"
+            )
+            trade = crud.create_trade(db, trade_data, user.id)
+            self.risk.on_fill(user.id, trade.id, notional, now_ist)
+            logger.info(f"Entered {option_type} trade {symbol} for user {user.username}")
+            return trade
+        except Exception as e:
+            logger.error(f"Error entering trade: {e}")
+            return None
+
+    def check_exits(self):
+        # TP/SL checks between signal candles
+        now_ist = datetime.datetime.now(IST)
+        if not market_calendar.is_market_open(now_ist - SESSION_GRACE):
+            return
+
+        with self._run_lock:
+            self._check_exits(now_ist)
+
+    def _check_exits(self, now_ist):
+        db = SessionLocal()
+        try:
+            active_users = db.query(models.User).filter(models.User.is_trading_active == True).all()
+            for user in active_users:
+                if not user.access_token or not user.api_key:
+                    continue
+                open_trades = crud.get_open_trades(db, user.id)
+                if not open_trades:
+                    self.prune_position_greeks(user.id, open_trades)
+                    continue
+                try:
+                    kite = self.get_kite(user)
+                    df_inst = self.get_instruments(kite, now_ist.date())
+                    curr_fut = self.get_nifty_future(df_inst)
+                    if curr_fut is None:
+                        continue
+                    fut_token = curr_fut['instrument_token']
+                    fut_ltp = kite.ltp(fut_token)[str(fut_token)]['last_price']
+                    self.manage_exits(kite, db, user, open_trades, df_inst, fut_ltp, now_ist)
+                except Exception as e:
+                    logger.error(f"Error checking exits for user {user.username}: {e}")
+        finally:
+            db.close()
+
+    def select_option(self, kite, df_inst, fut_ltp, option_type, now_ist):
+        options = df_inst[
+            (df_inst['name'] == 'NIFTY') & 
+            (df_inst['instrument_type'] == option_type)
+        ]
+        if options.empty:
+            return None
+        # Nearest expiry only
+        options = options[options['expiry'] == options['expiry'].min()]
+
+        if STRIKE_SELECTION == "delta":
+            target_opt = self.select_option_by_delta(kite, options, fut_ltp, option_type, now_ist)
+            if target_opt is not None:
+                return target_opt
+            logger.warning("Delta strike selection failed, falling back to fixed offset")
+
+        # ITM by fixed offset: CE below futures, PE above
+        offset = -STRIKE_OFFSET if option_type == 'CE' else STRIKE_OFFSET
+        strike = int(round((fut_ltp + offset) / STRIKE_STEP) * STRIKE_STEP)
+        options = options[options['strike'] == strike]
+        if options.empty:
+            return None
+        return options.iloc[0]
+
+    def select_option_by_delta(self, kite, options, fut_ltp, option_type, now_ist):
+        from . import greeks
+        # Price a window of strikes around ATM in one LTP call and one batched IV solve
+        atm = round(fut_ltp / STRIKE_STEP) * STRIKE_STEP
+        width = DELTA_CHAIN_WIDTH * STRIKE_STEP
+        chain = options[(options['strike'] >= atm - width) & (options['strike'] <= atm + width)]
+        if chain.empty:
+            return None
+
+        tokens = chain['instrument_token'].tolist()
+        ltp_data = kite.ltp(tokens)
+        prices = [ltp_data.get(str(t), {}).get('last_price', float('nan')) for t in tokens]
+
+        T = greeks.time_to_expiry(chain.iloc[0]['expiry'], now_ist)
+        idx, result = greeks.select_by_delta(
+            chain['strike'].values, prices, fut_ltp, T, option_type == 'CE', TARGET_DELTA
+        )
+        if idx is None:
+            return None
+        logger.info(
+            f"Delta selection {option_type}: strike {chain.iloc[idx]['strike']} "
+            f"delta {result['delta'][idx]:.3f} iv {result['iv'][idx]:.3f}"
+        )
+        return chain.iloc[idx]
+
+    def update_position_greeks(self, trade, opt_row, fut_ltp, current_price, now_ist):
+        from . import greeks
+        T = greeks.time_to_expiry(opt_row['expiry'], now_ist)
+        result = greeks.chain_greeks(
+            current_price, fut_ltp, opt_row['strike'], T, opt_row['instrument_type'] == 'CE'
+        )
+        # IV has no solution when the premium is at or below discounted
+        # intrinsic (common deep ITM); store None so the API can encode it
+        position = {k: float(v) if math.isfinite(float(v)) else None for k, v in result.items()}
+        position.update({
+            "trade_id": trade.id,
+            "user_id": trade.user_id,
+            "symbol": trade.symbol,
+            "ltp": current_price,
+            "fut_ltp": float(fut_ltp),
+            "position_delta": position["delta"] * trade.quantity if position["delta"] is not None else None,
+            "updated_at": now_ist,
+        })
+        self.position_greeks[trade.id] = position
+        return position
+
+    def run_strategy(self, interval=INTERVAL):
+        # Check Trading Session (IST)
         now_ist = datetime.datetime.now(IST)
-        current_time = now_ist.time()
         
-        if not (START_TIME <= current_time <= END_TIME):
-            logger.info(f"Outside trading hours (IST): {current_time}. Market closed.")
+        if not market_calendar.is_market_open(now_ist - SESSION_GRACE):
+            logger.info(f"Outside trading session (IST): {now_ist}. Market closed.")
             return
 
-        logger.info(f"Trading Engine Heartbeat (IST): {now_ist}")
+        logger.info(f"Trading Engine Heartbeat (IST): {now_ist} [{interval}]")
+        self.last_run_at = now_ist
+
+        with self._run_lock:
+            self._run_strategy(interval, now_ist)
+
+    def _run_strategy(self, interval, now_ist):
         db = SessionLocal()
         active_users = db.query(models.User).filter(models.User.is_trading_active == True).all()
+        # Stored in the DB so it reaches the engine whichever process the API call hit
+        self.risk.global_kill_switch = crud.get_global_kill_switch(db)
         
         for user in active_users:
             if not user.access_token or not user.api_key:
                 continue
             
             try:
-                kite = KiteConnect(api_key=user.api_key)
-                kite.set_access_token(user.access_token)
-                
-                # 1. Get NIFTY FUT Token
-                # For this example, I will assume we are trading NIFTY FUT directly or using it for signals
-                # We need to look up the token dynamically.
-                # Ideally, we cache instruments.
-                
-                # Dynamic Symbol Lookup (Expensive to do every loop, should cache)
-                # For prototype speed, I will search for NIFTY FUT current month
-                instruments = kite.instruments("NFO")
-                df_inst = pd.DataFrame(instruments)
+                kite = self.get_kite(user)
+                self.ensure_risk_state(db, user, now_ist)
                 
-                # Find current month future
-                # This is a simplification. Real code needs robust expiry handling.
-                current_month_str = now_ist.strftime("%y%b").upper() # 24JAN
-                fut_symbol_pattern = f"NIFTY {now_ist.strftime('%b').upper()} FUT" # NIFTY JAN FUT
-                
-                # Search for exactly NIFTY JAN FUT (Kite format usually NIFTY24JANFUT or similar)
-                # Let's look for name=NIFTY, segment=NFO-FUT
-                nifty_futs = df_inst[(df_inst['name'] == 'NIFTY') & (df_inst['segment'] == 'NFO-FUT')]
-                nifty_futs = nifty_futs.sort_values('expiry')
-                if nifty_futs.empty:
+                # 1. Get NIFTY FUT Token (instruments are cached for the day)
+                df_inst = self.get_instruments(kite, now_ist.date())
+                curr_fut = self.get_nifty_future(df_inst)
+                if curr_fut is None:
                     logger.error(f"No NIFTY Futures found for user {user.username}")
                     continue
                 
-                curr_fut = nifty_futs.iloc[0] # Nearest expiry
                 fut_token = curr_fut['instrument_token']
                 fut_symbol = curr_fut['tradingsymbol'] # e.g., NIFTY24JANFUT
                 
-                # 2. Get Historical Data
-                to_date = now_ist
-                from_date = to_date - datetime.timedelta(days=5)
-                
-                data = kite.historical_data(fut_token, from_date, to_date, INTERVAL)
-                df = pd.DataFrame(data)
+                # 2. Get Historical Data (closed candles, incrementally cached)
+                df = self.get_history(kite, fut_token, interval, now_ist)
                 if df.empty:
                     continue
-                    
-                df['date'] = pd.to_datetime(df['date'])
-                df.set_index('date', inplace=True)
                 
                 # 3. Calculate Supertrend
-                st = ta.supertrend(df["high"], df["low"], df["close"], length=ST_PERIOD, multiplier=ST_MULTIPLIER)
-                if st is None or st.empty:
+                signal_change = self.compute_signal(df)
+                if signal_change is None:
                     continue
-                    
-                df = pd.concat([df, st], axis=1)
                 
-                # Identify Supertrend column (usually SUPERT_7_3.0)
-                st_cols = [c for c in df.columns if c.startswith("SUPERT")]
-                if not st_cols:
-                    continue
-                dir_col = [c for c in df.columns if c.startswith("SUPERTd")][0]
-                
-                last_candle = df.iloc[-1]
-                prev_candle = df.iloc[-2]
-                
-                signal_change = last_candle[dir_col] - prev_candle[dir_col]
-                # 2 means Bullish Flip (-1 -> 1), -2 means Bearish Flip (1 -> -1)
-                
-                fut_ltp = last_candle['close']
+                fut_ltp = df.iloc[-1]['close']
                 
                 # 4. Check Open Positions
                 open_trades = crud.get_open_trades(db, user.id)
                 
-                # EXIT LOGIC
-                for trade in open_trades:
-                    # Check current price of the option
-                    # We need the option token.
-                    # In our DB we stored symbol. We need to find token again or store it.
-                    # For now let's resolve symbol to token.
-                    opt_inst = df_inst[df_inst['tradingsymbol'] == trade.symbol]
-                    if opt_inst.empty:
-                        continue
-                    opt_token = opt_inst.iloc[0]['instrument_token']
-                    
-                    ltp_data = kite.ltp(opt_token)
-                    if str(opt_token) not in ltp_data:
-                        continue
-                        
-                    current_price = ltp_data[str(opt_token)]['last_price']
-                    
-                    exit_trade = False
-                    reason = ""
-                    
-                    # Target / SL
-                    if current_price >= trade.entry_price * (1 + TP_PCT):
-                        exit_trade = True
-                        reason = "Target Hit"
-                    elif current_price <= trade.entry_price * (1 - SL_PCT):
-                        exit_trade = True
-                        reason = "SL Hit"
-                    
-                    # Trend Reversal
-                    # If Long (CE) and Signal becomes Bearish
-                        # if "CE" in trade.symbol and last_candle[dir_col] == -1:
-                        #     exit_trade = True
-                        #     reason = "Trend Reversal"
-                        # # If Short (PE) and Signal becomes Bullish
-                        # if "PE" in trade.symbol and last_candle[dir_col] == 1:
-                        #     exit_trade = True
-                        #     reason = "Trend Reversal"
-                        
-                    if exit_trade:
-                        # Place Sell Order
-                        try:
-                            order_id = kite.place_order(
-                                variety=kite.VARIETY_REGULAR,
-                                exchange=kite.EXCHANGE_NFO,
-                                tradingsymbol=trade.symbol,
-                                transaction_type=kite.TRANSACTION_TYPE_SELL,
-                                quantity=trade.quantity,
-                                product=kite.PRODUCT_MIS,
-                                order_type=kite.ORDER_TYPE_MARKET
-                            )
-                            logger.info(f"Exited trade {trade.symbol} for user {user.username}: {reason}")
-                            crud.close_trade(db, trade.id, current_price, reason)
-                        except Exception as e:
-                            logger.error(f"Error closing trade: {e}")
+                self.manage_exits(kite, db, user, open_trades, df_inst, fut_ltp, now_ist)
 
                 # ENTRY LOGIC
                 if not open_trades: # Only one trade at a time per strategy
                     if signal_change == 2: # Bullish -> Buy CE
-                        strike = int(round((fut_ltp - 200) / 50) * 50)
-                        # Find Expiry
-                        # For simplicity, using same expiry as future or nearest weekly
-                        # Let's filter options for that strike
-                        options = df_inst[
-                            (df_inst['name'] == 'NIFTY') & 
-                            (df_inst['strike'] == strike) & 
-                            (df_inst['instrument_type'] == 'CE')
-                        ].sort_values('expiry')
-                        
-                        if not options.empty:
-                            target_opt = options.iloc[0] # Nearest
-                            symbol = target_opt['tradingsymbol']
-                            
-                            # Place Order
-                            try:
-                                qty = user.num_lots * 65 # NIFTY Lot size
-                                order_id = kite.place_order(
-                                    variety=kite.VARIETY_REGULAR,
-                                    exchange=kite.EXCHANGE_NFO,
-                                    tradingsymbol=symbol,
-                                    transaction_type=kite.TRANSACTION_TYPE_BUY,
-                                    quantity=qty,
-                                    product=kite.PRODUCT_MIS,
-                                    order_type=kite.ORDER_TYPE_MARKET
-                                )
-                                # Fetch execution price (simplified: using LTP)
-                                ltp_data = kite.ltp(target_opt['instrument_token'])
-                                entry_price = ltp_data[str(target_opt['instrument_token'])]['last_price']
-                                
-                                trade_data = schemas.TradeCreate(
-                                    symbol=symbol,
-                                    entry_price=entry_price,
-                                    quantity=qty,
-                                    status="OPEN"
-                                )
-                                crud.create_trade(db, trade_data, user.id)
-                                logger.info(f"Entered CE trade {symbol} for user {user.username}")
-                            except Exception as e:
-                                logger.error(f"Error entering trade: {e}")
+                        # Nearest expiry, strike by fixed offset or target delta
+                        target_opt = self.select_option(kite, df_inst, fut_ltp, 'CE', now_ist)
+                        if target_opt is not None:
+                            self.enter_trade(kite, db, user, target_opt, now_ist)
 
                     elif signal_change == -2: # Bearish -> Buy PE
-                        strike = int(round((fut_ltp + 200) / 50) * 50)
-                        options = df_inst[
-                            (df_inst['name'] == 'NIFTY') & 
-                            (df_inst['strike'] == strike) & 
-                            (df_inst['instrument_type'] == 'PE')
-                        ].sort_values('expiry')
-                        
-                        if not options.empty:
-                            target_opt = options.iloc[0]
-                            symbol = target_opt['tradingsymbol']
-                            
-                            try:
-                                qty = user.num_lots * 65 # Lot size 75? Backtest said 65 (maybe old lot size, now it is 25/75 depending on time, assume 75 for Nifty or 25? User code says 65. Let's use user code.)
-                                # Wait, user code says LOT_SIZE = 65. I'll stick to user input.
-                                
-                                order_id = kite.place_order(
-                                    variety=kite.VARIETY_REGULAR,
-                                    exchange=kite.EXCHANGE_NFO,
-                                    tradingsymbol=symbol,
-                                    transaction_type=kite.TRANSACTION_TYPE_BUY,
-                                    quantity=qty,
-                                    product=kite.PRODUCT_MIS,
-                                    order_type=kite.ORDER_TYPE_MARKET
-                                )
-                                ltp_data = kite.ltp(target_opt['instrument_token'])
-                                entry_price = ltp_data[str(target_opt['instrument_token'])]['last_price']
-                                
-                                trade_data = schemas.TradeCreate(
-                                    symbol=symbol,
-                                    entry_price=entry_price,
-                                    quantity=qty,
-                                    status="OPEN"
-                                )
-                                crud.create_trade(db, trade_data, user.id)
-                                logger.info(f"Entered PE trade {symbol} for user {user.username}")
-                            except Exception as e:
-                                logger.error(f"Error entering trade: {e}")
+                        target_opt = self.select_option(kite, df_inst, fut_ltp, 'PE', now_ist)
+                        if target_opt is not None:
+                            self.enter_trade(kite, db, user, target_opt, now_ist)
 
             except Exception as e:
                 logger.error(f"Error processing user {user.username}: {e}")
@@ -0,0 +1,34 @@
+import datetime
+from apscheduler.triggers.base import BaseTrigger
+from . import market_calendar
+
+# APScheduler triggers driven by the market calendar, so jobs never wake up
+# on weekends, holidays or outside the session.
+
+
+class CandleCloseTrigger(BaseTrigger):
+    # Fires `delay` after each candle of `interval` closes
+    def __init__(self, interval, delay=datetime.timedelta(milliseconds=500)):
+        market_calendar.interval_minutes(interval)
+        self.interval = interval
+        self.delay = delay
+
+    def get_next_fire_time(self, previous_fire_time, now):
+        after = max(now, previous_fire_time) if previous_fire_time else now
+        return market_calendar.next_candle_close(after, self.interval, self.delay)
+
+    def __str__(self):
+        return f"candle_close[{self.interval}, +{self.delay.total_seconds():.3f}s]"
+
+
+class TradingDayTrigger(BaseTrigger):
+    # Fires once per trading day at wall-clock time `at` (IST)
+    def __init__(self, at):
+        self.at = at
+
+    def get_next_fire_time(self, previous_fire_time, now):
+        after = max(now, previous_fire_time) if previous_fire_time else now
+        return market_calendar.next_session_time(after, self.at)
+
+    def __str__(self):
+        return f"trading_day[{self.at.isoformat()}]"